@@ -0,0 +1,214 @@
+# ─────────────────────────────────
+# IMPORTS
+# ─────────────────────────────────
+from typing import Callable, Dict, Iterator, List
+
+Turn = Dict[str, str]
+
+# Per-message overhead of the chat template (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD = 4
+TOOL_RESPONSE_OVERHEAD = 6
+DROPPED_TOOL_OUTPUT = "[خروجی ابزار برای صرفه‌جویی در حافظه حذف شد.]"
+SUMMARY_HEADER = "خلاصهٔ بخش‌های قبلی گفتگو:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for when no tokenizer is available."""
+    return len(text) // 3 + 1
+
+
+# ─────────────────────────────────
+# SUMMARIZER
+# ─────────────────────────────────
+def extractive_summary(previous: str, turns: List[Turn], max_chars: int = 200) -> str:
+    """
+    Fold `turns` into `previous` without an LLM: keep the start of every user
+    and assistant message, skip tool outputs.
+    """
+    labels = {"user": "کاربر", "assistant": "دستیار"}
+    lines = [previous] if previous else []
+    for turn in turns:
+        label = labels.get(turn.get("role"))
+        content = " ".join(turn.get("content", "").split())
+        if label and content:
+            lines.append(f"{label}: {content[:max_chars]}")
+    return "\n".join(lines)
+
+
+# ─────────────────────────────────
+# CONVERSATION HISTORY
+# ─────────────────────────────────
+class ConversationHistory:
+    """
+    Chat history that keeps the prompt within a token budget.
+
+    Turns are kept for display (iteration, indexing, `append`, `clear`),
+    while `messages()` returns the compacted view used to render the prompt:
+    the system message, a rolling summary of older turns, then the recent turns.
+    Once folded into the summary, the oldest turns beyond `max_turns` are
+    deleted, and tool outputs that left the prompt no longer keep their text.
+
+    When the view exceeds `max_tokens`, it is compacted down to
+    `low_water * max_tokens` in one step: old tool outputs are dropped first,
+    then the oldest turns are folded into the summary. Between compactions
+    turns are only appended, so the rendered prefix stays identical from one
+    request to the next and llama.cpp can reuse its KV cache for it.
+
+    Token counts are cached per message text, so each turn is tokenized once.
+    """
+
+    def __init__(self, max_tokens: int = 2048, count_tokens: Callable[[str], int] = estimate_tokens,
+                 summarizer: Callable[[str, List[Turn]], str] = extractive_summary,
+                 summary_max_tokens: int = 256, keep_tool_outputs: int = 1, low_water: float = 0.6,
+                 max_turns: int = 100):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.summarizer = summarizer
+        self.summary_max_tokens = summary_max_tokens
+        self.keep_tool_outputs = keep_tool_outputs
+        self.low_water = low_water
+        self.max_turns = max_turns
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self._start = 0
+        self._dropped = set()
+        self._token_cache: Dict[str, int] = {}
+        header = self._turn_tokens({"role": "system", "content": f"{SUMMARY_HEADER}\n"})
+        if header > self._summary_budget():
+            raise ValueError(f"max_tokens={max_tokens} leaves no room for the conversation summary "
+                             f"({header} tokens needed).")
+
+    # ── list-like access used by the chat UI ──
+    def append(self, turn: Turn) -> None:
+        self.turns.append(turn)
+        if len(self.turns) > self.max_turns:
+            self._forget_folded()
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.summary = ""
+        self._start = 0
+        self._dropped = set()
+        self._token_cache.clear()
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self.turns)
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __getitem__(self, index):
+        return self.turns[index]
+
+    # ── token accounting ──────────────
+    def tokens(self, text: str) -> int:
+        """Cached token count of `text`."""
+        count = self._token_cache.get(text)
+        if count is None:
+            count = self._token_cache[text] = self.count_tokens(text)
+        return count
+
+    def reset_token_cache(self) -> None:
+        """Forget cached counts, e.g. after switching to a model with another tokenizer."""
+        self._token_cache.clear()
+
+    def _turn_tokens(self, turn: Turn) -> int:
+        overhead = TOOL_RESPONSE_OVERHEAD if turn.get("role") == "tool" else MESSAGE_OVERHEAD
+        return self.tokens(turn.get("content", "")) + overhead
+
+    def _has_system(self) -> bool:
+        return bool(self.turns) and self.turns[0].get("role") == "system"
+
+    def _body_start(self) -> int:
+        return max(self._start, 1 if self._has_system() else 0)
+
+    def _view(self, index: int) -> Turn:
+        turn = self.turns[index]
+        if index in self._dropped:
+            return {"role": turn["role"], "content": DROPPED_TOOL_OUTPUT}
+        return {"role": turn["role"], "content": turn.get("content", "")}
+
+    def _summary_turn(self) -> Turn:
+        return {"role": "system", "content": f"{SUMMARY_HEADER}\n{self.summary}"}
+
+    def token_count(self) -> int:
+        """Tokens of the current compacted view."""
+        return sum(self._turn_tokens(turn) for turn in self._messages())
+
+    # ── compaction ────────────────────
+    def _messages(self) -> List[Turn]:
+        messages = [self._view(0)] if self._has_system() else []
+        if self.summary:
+            messages.append(self._summary_turn())
+        messages.extend(self._view(i) for i in range(self._body_start(), len(self.turns)))
+        return messages
+
+    def _last_user_index(self) -> int:
+        for i in range(len(self.turns) - 1, -1, -1):
+            if self.turns[i].get("role") == "user":
+                return i
+        return len(self.turns)
+
+    def _summary_budget(self) -> int:
+        return min(self.summary_max_tokens, int(self.max_tokens * self.low_water) // 2)
+
+    def _trim_summary(self, budget: int) -> None:
+        """Keep only the most recent part of the summary within `budget` tokens."""
+        while self.summary and self._turn_tokens(self._summary_turn()) > budget:
+            _, _, rest = self.summary.partition("\n")
+            shorter = rest if rest else self.summary[len(self.summary) // 2:]
+            # Nothing left to cut: not even one character fits next to the header
+            self.summary = shorter if len(shorter) < len(self.summary) else ""
+
+    def compact(self) -> None:
+        """Compact the view to the low-water mark (see class docstring)."""
+        target = int(self.max_tokens * self.low_water)
+        summary_budget = self._summary_budget()
+        current = self._last_user_index()
+
+        # 1) Drop tool outputs from before the current exchange, oldest first
+        tool_indices = [i for i in range(self._body_start(), current)
+                        if self.turns[i].get("role") == "tool" and i not in self._dropped]
+        droppable = tool_indices[:max(len(tool_indices) - self.keep_tool_outputs, 0)]
+        for i in droppable:
+            if self.token_count() <= target:
+                break
+            self._dropped.add(i)
+            self.turns[i] = {"role": "tool", "content": DROPPED_TOOL_OUTPUT}
+
+        # 2) Fold the oldest turns into the rolling summary, reserving room for it
+        if self.token_count() > target:
+            folded = []
+            total = self.token_count() - (self._turn_tokens(self._summary_turn()) if self.summary else 0)
+            while total + summary_budget > target and self._body_start() < current:
+                i = self._body_start()
+                total -= self._turn_tokens(self._view(i))
+                folded.append(self._view(i))
+                self._start = i + 1
+            if folded:
+                self.summary = self.summarizer(self.summary, folded)
+                self._trim_summary(summary_budget)
+            # Folded tool outputs are not displayed; only the summary needs them
+            for i in range(self._start):
+                if self.turns[i].get("role") == "tool":
+                    self.turns[i] = {"role": "tool", "content": DROPPED_TOOL_OUTPUT}
+
+        self._dropped = {i for i in self._dropped if i >= self._body_start()}
+        self._forget_folded()
+        live = {turn.get("content", "") for turn in self._messages()}
+        self._token_cache = {text: n for text, n in self._token_cache.items() if text in live}
+
+    def _forget_folded(self) -> None:
+        """Delete the oldest folded turns beyond `max_turns`; the summary covers them."""
+        first = 1 if self._has_system() else 0
+        excess = min(len(self.turns) - self.max_turns, self._start - first)
+        if excess > 0:
+            del self.turns[first:first + excess]
+            self._start -= excess
+            self._dropped = {i - excess for i in self._dropped}
+
+    def messages(self) -> List[Turn]:
+        """The compacted list of turns to render into the prompt."""
+        if self.token_count() > self.max_tokens:
+            self.compact()
+        return self._messages()
@@ -0,0 +1,394 @@
+# ─────────────────────────────────
+# IMPORTS
+# ─────────────────────────────────
+import os
+import json
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ─────────────────────────────────
+# SHARD LAYOUT
+# ─────────────────────────────────
+# Every shard is a directory holding its own FAISS index, chunk store and
+# (optionally) a pre-built BM25 model:
+#
+#   <shard_dir>/
+#   ├── chunks.pkl              # list of Document objects
+#   ├── faiss_index.faiss/      # FAISS.save_local() folder (index.faiss + index.pkl)
+#   └── bm25.pkl                # built from chunks.pkl and saved on first load
+#
+# The top-level `data/` folder produced by the preprocessing and embeddings
+# notebooks already follows this layout, so it can be used as a single shard.
+CHUNKS_FILE = "chunks.pkl"
+FAISS_DIR = "faiss_index.faiss"
+BM25_FILE = "bm25.pkl"
+
+DEFAULT_INDEX = "default"
+
+
+def _directory_size(path: str) -> int:
+    """Return the total size in bytes of all files under `path`."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _min_max(scores: List[float]) -> List[float]:
+    """Min-max normalize `scores` to [0, 1]; constant lists map to zeros."""
+    high, low = max(scores, default=1.0), min(scores, default=0.0)
+    if high > low:
+        return [(s - low) / (high - low) for s in scores]
+    return [0.0] * len(scores)
+
+
+# ─────────────────────────────────
+# SHARD
+# ─────────────────────────────────
+class Shard:
+    """
+    A loaded shard: FAISS vector store, its chunks and a BM25 model over them.
+    `size_bytes` is the on-disk footprint used for the registry's memory cap.
+    """
+
+    def __init__(self, vectorstore: Any, chunks: List[Any], bm25: Any, size_bytes: int = 0):
+        self.vectorstore = vectorstore
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.size_bytes = size_bytes
+        self.chunk_ids = {doc.page_content: i for i, doc in enumerate(chunks)}
+
+    def search(self, query_vector: List[float], fetch_k: int) -> List[Tuple[Any, float]]:
+        """Dense top-`fetch_k` search as (document, distance) pairs, closest first."""
+        return self.vectorstore.similarity_search_with_score_by_vector(query_vector, k=fetch_k)
+
+    def bm25_scores(self, query_tokens: List[str], docs: List[Any]) -> List[float]:
+        """
+        Normalized BM25 scores of `docs` for `query_tokens`. Documents that are
+        not in this shard's chunk store score 0.
+        """
+        doc_ids = [self.chunk_ids.get(doc.page_content) for doc in docs]
+        known = [i for i in doc_ids if i is not None]
+        if len(known) < len(doc_ids):
+            print(f"{len(doc_ids) - len(known)} FAISS hits are missing from {CHUNKS_FILE}; scoring them 0 for BM25")
+        scores = iter(_min_max(list(self.bm25.get_batch_scores(query_tokens, known))) if known else [])
+        return [0.0 if i is None else next(scores) for i in doc_ids]
+
+
+def load_shard(path: str, embeddings: Any) -> Shard:
+    """
+    Load a shard directory. The FAISS index is memory-mapped where faiss
+    supports it, so only the pages touched by a search become resident:
+    `IO_FLAG_MMAP` maps the inverted lists of IVF indexes, and the flat
+    indexes built by `FAISS.from_documents` are only mapped on faiss versions
+    that have `IO_FLAG_MMAP_IFC`. Otherwise they are read fully into RAM.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    faiss_dir = os.path.join(path, FAISS_DIR)
+    index_file = os.path.join(faiss_dir, "index.faiss")
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        index = faiss.read_index(index_file, flags)
+    except RuntimeError:
+        # Not every index type can be mmapped; fall back to a regular read
+        index = faiss.read_index(index_file)
+    with open(os.path.join(faiss_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    with open(os.path.join(path, CHUNKS_FILE), "rb") as f:
+        chunks = pickle.load(f)
+
+    return Shard(vectorstore, chunks, load_bm25(path, chunks), size_bytes=_directory_size(path))
+
+
+def _build_bm25(chunks: List[Any]) -> Any:
+    from hazm import word_tokenize
+    from rank_bm25 import BM25Okapi
+    return BM25Okapi([word_tokenize(doc.page_content) for doc in chunks])
+
+
+def _write_bm25(bm25_path: str, bm25: Any) -> None:
+    tmp_path = f"{bm25_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(bm25, f)
+    os.replace(tmp_path, bm25_path)
+
+
+def load_bm25(path: str, chunks: List[Any]) -> Any:
+    """
+    Load the shard's BM25 model, or build it from `chunks` and save it as
+    `bm25.pkl` so later loads (including reloads after eviction) skip
+    tokenizing the corpus. A `bm25.pkl` older than `chunks.pkl` is rebuilt.
+    """
+    bm25_path = os.path.join(path, BM25_FILE)
+    chunks_path = os.path.join(path, CHUNKS_FILE)
+    if os.path.exists(bm25_path) and os.path.getmtime(bm25_path) >= os.path.getmtime(chunks_path):
+        with open(bm25_path, "rb") as f:
+            return pickle.load(f)
+
+    bm25 = _build_bm25(chunks)
+    try:
+        _write_bm25(bm25_path, bm25)
+    except OSError as e:
+        print(f"Could not save {bm25_path}: {e}")
+    return bm25
+
+
+def save_shard(path: str, chunks: List[Any], vectorstore: Any) -> None:
+    """
+    Write `chunks`, their FAISS `vectorstore` and a pre-built BM25 model into a
+    new shard directory, so even its first load does not tokenize the corpus.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, CHUNKS_FILE), "wb") as f:
+        pickle.dump(chunks, f)
+    vectorstore.save_local(os.path.join(path, FAISS_DIR))
+    _write_bm25(os.path.join(path, BM25_FILE), _build_bm25(chunks))
+
+
+# ─────────────────────────────────
+# INDEX REGISTRY
+# ─────────────────────────────────
+class _ShardSlot:
+    """Bookkeeping for one shard directory: lazy load lock, users and LRU time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.shard: Optional[Shard] = None
+        self.load_lock = threading.Lock()
+        self.in_use = 0
+        self.last_used = 0.0
+
+
+class IndexRegistry:
+    """
+    Maps index names (e.g. a customer or a collection) to shard directories.
+
+    Shards are loaded on first use and kept in an LRU; when the resident size
+    exceeds `max_memory_bytes`, idle shards are evicted. A query fans out over
+    all shards of the selected index in a thread pool, and the closest
+    `fetch_k` candidates overall are reranked with the shared CrossEncoder.
+    """
+
+    def __init__(
+        self,
+        indexes: Dict[str, List[str]],
+        embeddings: Any,
+        cross_encoder: Any,
+        *,
+        default_index: str = DEFAULT_INDEX,
+        max_memory_bytes: Optional[int] = None,
+        max_workers: int = 4,
+        fetch_k: int = 100,
+        bm25_weight: float = 0.4,
+        cross_encoder_weight: float = 0.6,
+        batch_size: int = 8,
+        loader: Callable[[str, Any], Shard] = load_shard,
+        tokenizer: Optional[Callable[[str], List[str]]] = None,
+        score_cache_size: int = 4096,
+    ):
+        self.indexes = {name: list(paths) for name, paths in indexes.items()}
+        self.embeddings = embeddings
+        self.cross_encoder = cross_encoder
+        self.default_index = default_index
+        self.max_memory_bytes = max_memory_bytes
+        self.fetch_k = fetch_k
+        self.bm25_weight = bm25_weight
+        self.cross_encoder_weight = cross_encoder_weight
+        self.batch_size = batch_size
+        self.loader = loader
+        self.tokenizer = tokenizer
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard")
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, _ShardSlot]" = OrderedDict()
+        self.score_cache_size = score_cache_size
+        self._score_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._score_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_path: str, embeddings: Any, cross_encoder: Any, **kwargs) -> "IndexRegistry":
+        """
+        Build a registry from a JSON file of the form
+        `{"<name>": {"shards": ["<dir>", ...]}, ...}`.
+        Relative shard paths are resolved against the config file's folder.
+        """
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(config_path))
+        indexes = {
+            name: [os.path.normpath(os.path.join(base_dir, p)) for p in entry["shards"]]
+            for name, entry in config.items()
+        }
+        return cls(indexes, embeddings, cross_encoder, **kwargs)
+
+    # ── shard lifecycle ──────────────
+    def _acquire(self, path: str) -> Shard:
+        """Return the loaded shard at `path`, loading it if needed, and pin it."""
+        with self._lock:
+            slot = self._slots.get(path)
+            if slot is None:
+                slot = self._slots[path] = _ShardSlot(path)
+            slot.in_use += 1
+            self._slots.move_to_end(path)
+
+        try:
+            with slot.load_lock:
+                if slot.shard is None:
+                    print(f"Loading shard {path}")
+                    slot.shard = self.loader(path, self.embeddings)
+        except Exception:
+            self._release(path)
+            raise
+
+        self._evict_if_needed()
+        return slot.shard
+
+    def _release(self, path: str) -> None:
+        with self._lock:
+            slot = self._slots[path]
+            slot.in_use -= 1
+            slot.last_used = time.monotonic()
+
+    def _evict_if_needed(self) -> None:
+        """Drop least recently used idle shards until under the memory cap."""
+        if self.max_memory_bytes is None:
+            return
+        with self._lock:
+            for path in list(self._slots):
+                if self.memory_usage() <= self.max_memory_bytes:
+                    break
+                slot = self._slots[path]
+                if slot.in_use == 0 and slot.shard is not None:
+                    print(f"Evicting shard {path}")
+                    del self._slots[path]
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by loaded shards."""
+        return sum(s.shard.size_bytes for s in list(self._slots.values()) if s.shard is not None)
+
+    def loaded_shards(self) -> List[str]:
+        """Paths of the currently loaded shards, least recently used first."""
+        return [path for path, slot in list(self._slots.items()) if slot.shard is not None]
+
+    def unload(self) -> None:
+        """Drop every idle shard."""
+        with self._lock:
+            for path in [p for p, s in self._slots.items() if s.in_use == 0]:
+                del self._slots[path]
+
+    # ── querying ─────────────────────
+    def resolve(self, index: Optional[str] = None) -> List[str]:
+        """Return the shard paths for `index` (the default index when empty)."""
+        name = (index or "").strip() or self.default_index
+        if name not in self.indexes:
+            raise ValueError(f"ایندکس «{name}» وجود ندارد.")
+        return self.indexes[name]
+
+    def _tokenize(self, query: str) -> List[str]:
+        if self.tokenizer is None:
+            from hazm import word_tokenize
+            self.tokenizer = word_tokenize
+        return self.tokenizer(query)
+
+    def _search_shard(self, path: str, query_vector: List[float]) -> List[Tuple[Any, float, Shard]]:
+        shard = self._acquire(path)
+        try:
+            return [(doc, distance, shard) for doc, distance in shard.search(query_vector, self.fetch_k)]
+        finally:
+            self._release(path)
+
+    def candidates(self, query: str, index: Optional[str] = None) -> Dict[str, Tuple[Any, Shard]]:
+        """
+        Fan `query` out over every shard of `index` and merge the dense hits
+        into `{page_content: (document, shard)}`, keeping only the global
+        top-`fetch_k` by FAISS distance so the reranking cost does not grow
+        with the number of shards. Distances are comparable because every
+        shard is built with the same embeddings and the default L2 metric.
+        A chunk found in several shards keeps its closest hit.
+
+        Holding the `Shard` lets `rank()` score BM25 without loading it
+        again, even if it has been evicted from the registry in the meantime.
+        """
+        paths = self.resolve(index)
+        query_vector = self.embeddings.embed_query(query)
+        futures = [self.executor.submit(self._search_shard, p, query_vector) for p in paths]
+        hits = sorted((hit for future in futures for hit in future.result()), key=lambda hit: hit[1])
+        merged: Dict[str, Tuple[Any, Shard]] = {}
+        for doc, _, shard in hits:
+            if len(merged) >= self.fetch_k:
+                break
+            merged.setdefault(doc.page_content, (doc, shard))
+        return merged
+
+    def _cross_encoder_scores(self, query: str, docs: List[Any]) -> List[float]:
+        """Raw CrossEncoder scores, computed only for (query, chunk) pairs not seen recently."""
+        with self._score_lock:
+            cached = {}
+            for doc in docs:
+                key = (query, doc.page_content)
+                cached[doc.page_content] = self._score_cache.get(key)
+                if key in self._score_cache:
+                    self._score_cache.move_to_end(key)
+        missing = [text for text, score in cached.items() if score is None]
+        if missing:
+            scores = self.cross_encoder.predict([[query, text] for text in missing], batch_size=self.batch_size)
+            with self._score_lock:
+                for text, score in zip(missing, scores):
+                    cached[text] = self._score_cache[(query, text)] = float(score)
+                while len(self._score_cache) > self.score_cache_size:
+                    self._score_cache.popitem(last=False)
+        return [cached[doc.page_content] for doc in docs]
+
+    def rank(self, query: str, candidates: Dict[str, Tuple[Any, Shard]], k: int = 5,
+             min_score: Optional[float] = 0.5) -> List[Any]:
+        """
+        Score every candidate against `query` with BM25 (normalized per shard)
+        and the CrossEncoder, and return the top-`k` documents above
+        `min_score`. Candidates may come from several queries: all of them
+        are scored against this one.
+        """
+        if not candidates:
+            return []
+        query_tokens = self._tokenize(query)
+        by_shard: Dict[Shard, List[Any]] = {}
+        for doc, shard in candidates.values():
+            by_shard.setdefault(shard, []).append(doc)
+        futures = {shard: self.executor.submit(shard.bm25_scores, query_tokens, docs)
+                   for shard, docs in by_shard.items()}
+        bm25_by_text = {}
+        for shard, docs in by_shard.items():
+            for doc, score in zip(docs, futures[shard].result()):
+                bm25_by_text[doc.page_content] = score
+
+        docs = [doc for doc, _ in candidates.values()]
+        bm25_norm = [bm25_by_text[doc.page_content] for doc in docs]
+        ce_norm = _min_max(self._cross_encoder_scores(query, docs))
+
+        combined = [self.bm25_weight * b + self.cross_encoder_weight * c for b, c in zip(bm25_norm, ce_norm)]
+        ranked = sorted(zip(docs, combined), key=lambda x: x[1], reverse=True)
+        if min_score is not None:
+            ranked = [(doc, score) for doc, score in ranked if score >= min_score]
+        return [doc for doc, _ in ranked[:k]]
+
+    def search(self, query: str, index: Optional[str] = None, k: int = 5, min_score: Optional[float] = 0.5) -> List[Any]:
+        """
+        Retrieve the top-`k` documents for `query` from every shard of `index`.
+        Scores combine per-shard normalized BM25 with CrossEncoder scores
+        computed over the merged candidate set.
+        """
+        return self.rank(query, self.candidates(query, index), k=k, min_score=min_score)
+
+
+def merge_candidates(merged: Dict[str, Tuple[Any, Shard]], hits: Iterable[Tuple[Any, Shard]]) -> Dict[str, Tuple[Any, Shard]]:
+    """Add (document, shard) `hits` into `merged`, keeping the first entry per chunk."""
+    for doc, shard in hits:
+        merged.setdefault(doc.page_content, (doc, shard))
+    return merged
@@ -1,5 +1,76 @@
-from llama_cpp import Llama
 import gc
+import threading
+from contextlib import contextmanager
+
+
+class LLMLock:
+    """
+    Reentrant lock for a llama_cpp model, which is not thread-safe.
+
+    Foreground work (generation, query rewrite, warmup, loading and unloading
+    models) takes it with `with llm_lock:`. Background work such as the answer
+    audit uses `with llm_lock.background():` and only gets the lock while no
+    foreground caller is waiting, so a new question never queues behind it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owner = None
+        self._depth = 0
+        self._foreground_count = 0
+        # Set while at least one foreground caller is blocked on the lock
+        self.foreground_waiting = threading.Event()
+
+    def acquire(self, background=False):
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return True
+            if not background:
+                self._foreground_count += 1
+                self.foreground_waiting.set()
+            try:
+                while self._owner is not None or (background and self._foreground_count):
+                    self._cond.wait()
+            finally:
+                if not background:
+                    self._foreground_count -= 1
+                    if not self._foreground_count:
+                        self.foreground_waiting.clear()
+                    self._cond.notify_all()
+            self._owner = me
+            self._depth = 1
+            return True
+
+    def release(self):
+        with self._cond:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("Cannot release an LLMLock held by another thread.")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def background(self):
+        """Hold the lock at background priority."""
+        self.acquire(background=True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+# Shared by every stage that calls the LLM: the chat UI, QueryStage and AuditWorker
+llm_lock = LLMLock()
+
 
 class ModelManager:
     def __init__(self):
@@ -17,6 +88,8 @@ class ModelManager:
             "verbose": True,
             "chat_format":"qwen"
         }
+        # RAM for saved llama.cpp states (KV cache); 0 disables the state cache
+        self.state_cache_bytes = 1 << 30
 
     def load_model(self, model_path, model_key, **kwargs):
         """Load a new model or skip if already loaded"""
@@ -24,23 +97,40 @@ class ModelManager:
             print(f"Model {model_key} is already loaded.")
             return
 
-        self.unload_model()
+        with llm_lock:
+            self.unload_model()
+
+            print(f"Loading model {model_key} from {model_path}")
+            from llama_cpp import Llama, LlamaRAMCache
+            # Combine default params with model-specific params
+            model_params = {**self.default_params, **kwargs}
+            state_cache_bytes = model_params.pop("state_cache_bytes", self.state_cache_bytes)
+            self.current_model = Llama(model_path=model_path, **model_params)
+            if state_cache_bytes:
+                # The query rewrite and the audit share no prefix with the chat
+                # prompt; restoring the chat's saved state after them avoids
+                # re-prefilling the system prompt, tools and history.
+                self.current_model.set_cache(LlamaRAMCache(capacity_bytes=state_cache_bytes))
+            self.current_model_key = model_key
 
-        print(f"Loading model {model_key} from {model_path}")
-        # Combine default params with model-specific params
-        model_params = {**self.default_params, **kwargs}
-        self.current_model = Llama(model_path=model_path, **model_params)
-        self.current_model_key = model_key
+    def use_model(self, model, model_key):
+        """Use an already constructed model (e.g. a stub LLM) as the current model"""
+        with llm_lock:
+            if self.current_model_key != model_key:
+                self.unload_model()
+            self.current_model = model
+            self.current_model_key = model_key
 
     def unload_model(self):
         """Unload the current model and free GPU resources."""
-        if self.current_model:
-            print(f"Unloading model {self.current_model_key}")
-            del self.current_model
-            del self.current_model_key
-            gc.collect()
-            self.current_model = None
-            self.current_model_key = None
+        with llm_lock:
+            if self.current_model:
+                print(f"Unloading model {self.current_model_key}")
+                del self.current_model
+                del self.current_model_key
+                gc.collect()
+                self.current_model = None
+                self.current_model_key = None
 
     def get_current_model(self):
         """Return the currently loaded model"""
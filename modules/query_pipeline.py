@@ -0,0 +1,124 @@
+# ─────────────────────────────────
+# IMPORTS
+# ─────────────────────────────────
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from modules.index_registry import merge_candidates
+from modules.model_manager import llm_lock
+from modules.utils import rewrite_user_query, audit_response
+
+
+# ─────────────────────────────────
+# SPECULATIVE RETRIEVAL
+# ─────────────────────────────────
+class QueryStage:
+    """
+    Overlaps query rewriting with retrieval.
+
+    Retrieval for the original query (fan-out and ranking) starts on a
+    background thread while the LLM rewrites the query. If the rewrite
+    differs, the rewritten query still runs the full candidate fan-out
+    (embedding, FAISS and every shard); only the reranking is deduplicated.
+    The merged candidates are scored against the user's question, with BM25
+    and CrossEncoder alike, and the CrossEncoder only scores chunks it has
+    not already seen for that question.
+    """
+
+    def __init__(self, registry: Any, get_llm: Callable[[], Any], rewrite: bool = True, max_workers: int = 2):
+        self.registry = registry
+        self.get_llm = get_llm
+        self.rewrite = rewrite
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-stage")
+
+    def _speculate(self, query: str, index: Optional[str], k: int, min_score: Optional[float]):
+        candidates = self.registry.candidates(query, index)
+        return candidates, self.registry.rank(query, candidates, k=k, min_score=min_score)
+
+    def retrieve(self, query: str, index: Optional[str] = None, k: int = 5,
+                 min_score: Optional[float] = 0.5) -> Tuple[List[Any], str]:
+        """Return (top-`k` documents, rewritten query) for `query`."""
+        speculative = self.executor.submit(self._speculate, query, index, k, min_score)
+
+        rewritten = query
+        llm = self.get_llm()
+        if self.rewrite and llm is not None:
+            with llm_lock:
+                rewritten = rewrite_user_query(query, llm).strip() or query
+
+        candidates, docs = speculative.result()
+        if rewritten == query:
+            return docs, rewritten
+
+        delta = self.registry.candidates(rewritten, index)
+        merge_candidates(candidates, delta.values())
+        return self.registry.rank(query, candidates, k=k, min_score=min_score), rewritten
+
+
+# ─────────────────────────────────
+# ASYNCHRONOUS AUDIT
+# ─────────────────────────────────
+class AuditWorker:
+    """
+    Runs `audit_response` on a background thread after an answer has been
+    shown. The audit takes the LLM lock at background priority, so a new
+    question is generated before any audit that has not started yet.
+
+    Only the latest answer is worth auditing: at most one job waits, and
+    submitting a new one replaces it. A replaced job is dropped without
+    calling its `on_result`.
+
+    `on_result(job_id, is_clean)` is called from the worker thread with
+    True/False, or None if the audit itself failed.
+    """
+
+    def __init__(self, get_llm: Callable[[], Any]):
+        self.get_llm = get_llm
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self.worker = threading.Thread(target=self._run, name="audit", daemon=True)
+        self.worker.start()
+
+    def submit(self, job_id: Any, answer: str, context: str,
+               on_result: Callable[[Any, Optional[bool]], None]) -> Optional[Any]:
+        """Queue an audit; returns the id of the waiting job it replaced, if any."""
+        with self._cond:
+            replaced = self._pending[0] if self._pending is not None else None
+            self._pending = (job_id, answer, context, on_result)
+            self._cond.notify_all()
+        return replaced
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+            # Take the job only once the LLM is ours, so a newer answer
+            # submitted while generation held the lock replaces this one
+            with llm_lock.background():
+                with self._cond:
+                    job_id, answer, context, on_result = self._pending
+                    self._pending = None
+                    self._busy = True
+                try:
+                    llm = self.get_llm()
+                    is_clean = None if llm is None else audit_response(answer, context, llm)
+                except Exception as e:
+                    print(f"Audit {job_id} failed: {e}")
+                    is_clean = None
+            try:
+                on_result(job_id, is_clean)
+            except Exception as e:
+                print(f"Audit callback for {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def join(self) -> None:
+        """Block until the waiting and running audits have finished."""
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
@@ -0,0 +1,178 @@
+# ─────────────────────────────────
+# IMPORTS
+# ─────────────────────────────────
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Heavy libraries (torch, sentence_transformers, langchain, faiss, llama_cpp)
+# are only imported inside the loader functions below, so importing this
+# module is cheap and the loaders can run in parallel threads.
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+# ─────────────────────────────────
+# STARTUP ORCHESTRATOR
+# ─────────────────────────────────
+class Component:
+    """One startup unit: how to load it, how to warm it up, and what it needs."""
+
+    def __init__(self, name: str, loader: Callable[..., Any], warmup: Optional[Callable[[Any], Any]] = None,
+                 requires: Iterable[str] = ()):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.requires = list(requires)
+        self.state = PENDING
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.timings: Dict[str, float] = {}
+        self.done = threading.Event()
+
+
+class StartupOrchestrator:
+    """
+    Loads independent components in parallel threads, runs a warmup call
+    through each one and records per-component load and warmup times.
+
+    A component listed in another's `requires` is passed to that loader as a
+    keyword argument once it is ready; if it fails, its dependents fail too.
+
+    Example:
+        startup = StartupOrchestrator()
+        startup.add("embeddings", load_embeddings, warmup=warmup_embeddings)
+        startup.add("registry", lambda embeddings: ..., requires=["embeddings"])
+        startup.start()
+        registry = startup.wait("registry")
+    """
+
+    def __init__(self):
+        self.components: Dict[str, Component] = {}
+        self.started_at: Optional[float] = None
+
+    def add(self, name: str, loader: Callable[..., Any], warmup: Optional[Callable[[Any], Any]] = None,
+            requires: Iterable[str] = ()) -> "StartupOrchestrator":
+        """Register a component. Must be called before `start()`."""
+        if self.started_at is not None:
+            raise RuntimeError("Cannot add components after startup has begun.")
+        self.components[name] = Component(name, loader, warmup, requires)
+        return self
+
+    def start(self) -> "StartupOrchestrator":
+        """Start every component on its own daemon thread and return immediately."""
+        for component in self.components.values():
+            missing = [dep for dep in component.requires if dep not in self.components]
+            if missing:
+                raise ValueError(f"Component {component.name} requires unknown components: {missing}")
+        self.started_at = time.perf_counter()
+        for component in self.components.values():
+            threading.Thread(target=self._run, args=(component,), name=f"startup-{component.name}",
+                             daemon=True).start()
+        return self
+
+    def _run(self, component: Component) -> None:
+        try:
+            deps = {}
+            for dep in component.requires:
+                deps[dep] = self.wait(dep)
+
+            component.state = LOADING
+            t = time.perf_counter()
+            component.value = component.loader(**deps)
+            component.timings["load"] = time.perf_counter() - t
+
+            if component.warmup is not None:
+                component.state = WARMING
+                t = time.perf_counter()
+                component.warmup(component.value)
+                component.timings["warmup"] = time.perf_counter() - t
+
+            component.timings["ready_at"] = time.perf_counter() - self.started_at
+            component.state = READY
+        except BaseException as e:
+            component.error = e
+            component.state = FAILED
+            print(f"Startup of {component.name} failed: {e}")
+        finally:
+            component.done.set()
+
+    # ── readiness ────────────────────
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        """Whether component `name` (or every component when omitted) is ready."""
+        if name is not None:
+            return self.components[name].state == READY
+        return all(c.state == READY for c in self.components.values())
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Block until component `name` is ready and return its value.
+        Raises RuntimeError if it failed and TimeoutError if `timeout` expires.
+        """
+        component = self.components[name]
+        if not component.done.wait(timeout):
+            raise TimeoutError(f"Component {name} is not ready yet ({component.state}).")
+        if component.state == FAILED:
+            raise RuntimeError(f"Component {name} failed to start: {component.error}")
+        return component.value
+
+    def status(self) -> Dict[str, str]:
+        """Current state of each component."""
+        return {name: c.state for name, c in self.components.items()}
+
+    def report(self) -> str:
+        """Per-component startup-time breakdown, one line per component."""
+        lines = [f"{'component':<16}{'state':<10}{'load':>9}{'warmup':>9}{'ready at':>10}"]
+        for name, c in self.components.items():
+            load = c.timings.get("load")
+            warmup = c.timings.get("warmup")
+            ready_at = c.timings.get("ready_at")
+            lines.append(
+                f"{name:<16}{c.state:<10}"
+                f"{'' if load is None else f'{load:.2f}s':>9}"
+                f"{'' if warmup is None else f'{warmup:.2f}s':>9}"
+                f"{'' if ready_at is None else f'{ready_at:.2f}s':>10}"
+            )
+        return "\n".join(lines)
+
+
+# ─────────────────────────────────
+# COMPONENT LOADERS
+# ─────────────────────────────────
+EMBEDDINGS_MODEL = "HooshvareLab/bert-fa-base-uncased"
+CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+WARMUP_QUERY = "سلام"
+
+
+def load_embeddings(device: str = "cpu"):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL, model_kwargs={"device": device})
+
+
+def load_cross_encoder(device: str = "cpu"):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(CROSS_ENCODER_MODEL, device=device)
+
+
+def warmup_embeddings(embeddings) -> None:
+    embeddings.embed_query(WARMUP_QUERY)
+
+
+def warmup_cross_encoder(cross_encoder) -> None:
+    cross_encoder.predict([[WARMUP_QUERY, WARMUP_QUERY]])
+
+
+def warmup_registry(registry) -> None:
+    """Load and exercise the default index's shards."""
+    registry.search(WARMUP_QUERY, min_score=None)
+
+
+def warmup_llm(llm) -> None:
+    """Run one token through `llm`, holding the LLM lock so it cannot race a question."""
+    from modules.model_manager import llm_lock
+    with llm_lock:
+        llm.create_completion(prompt=WARMUP_QUERY, max_tokens=1, stream=False)
@@ -2,17 +2,25 @@
 # ─────────────────────────────────
 # Text normalization and cleaning
 # ─────────────────────────────────
-from hazm import Normalizer
 import re
 
-normalizer = Normalizer()
+# hazm is imported on first use so that importing this module stays cheap
+_normalizer = None
+
+def get_normalizer():
+    """Return the shared hazm Normalizer, creating it on first call."""
+    global _normalizer
+    if _normalizer is None:
+        from hazm import Normalizer
+        _normalizer = Normalizer()
+    return _normalizer
 
 def clean_text(text: str) -> str:
     """
     Normalize Persian text, remove non-Arabic/Persian characters (except digits, punctuation),
     and collapse multiple whitespace.
     """
-    text = normalizer.normalize(text)
+    text = get_normalizer().normalize(text)
     # Remove any character not in Arabic/Persian unicode block, digits, or common punctuation
     text = re.sub(r'[^\u0600-\u06FF0-9\s\.\،\؟\!\,\;\:]', ' ', text)
     text = re.sub(r'\s+', ' ', text.strip())
@@ -21,22 +29,24 @@ def clean_text(text: str) -> str:
 # ─────────────────────────────────
 # RERANK DOCUMENTS
 # ─────────────────────────────────
-import numpy as np
-from collections import defaultdict
-from rank_bm25 import BM25Okapi
-from sentence_transformers import CrossEncoder
-from hazm import word_tokenize
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
 
 # Assume `chunks` is globally available or passed as argument
 bm25_cache = {}
 
-def rerank_documents(query: str, documents: list, chunks: list, cross_encoder: CrossEncoder,
+def rerank_documents(query: str, documents: list, chunks: list, cross_encoder: "CrossEncoder",
                      bm25_weight: float = 0.4, cross_encoder_weight: float = 0.6, 
                      batch_size: int = 8, min_score: float = None) -> list:
     """
     Rerank `documents` using BM25 + CrossEncoder combination.
     Returns top-5 documents above `min_score` threshold (if specified).
     """
+    from hazm import word_tokenize
+    from rank_bm25 import BM25Okapi
+
     tokenized_chunks = [word_tokenize(doc.page_content) for doc in chunks]
     bm25 = BM25Okapi(tokenized_chunks)
     
@@ -0,0 +1,273 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from modules.utils import sanitize_input, build_context, build_prompt
+from modules.qa import handle_greeting, handle_meta_question
+from modules.model_manager import ModelManager
+
+_DONE = object()
+
+
+class StubLLM:
+    """
+    Stand-in for llama_cpp.Llama with the same `create_completion` shape.
+    Answers with the first sentence of the prompt's <CONTEXT>, or 'نمی‌دونم.'.
+    """
+
+    def create_completion(self, prompt, **kwargs):
+        match = re.search(r"<CONTEXT>\s*(.*?)\s*</CONTEXT>", prompt, re.DOTALL)
+        context = re.sub(r"\[Chunk [^\]]*\]\n", "", match.group(1)) if match else ""
+        text = re.split(r"[.۔؟!\n]", context.strip(), maxsplit=1)[0].strip()
+        return {"choices": [{"text": text or "نمی‌دونم."}]}
+
+
+def load_questions(file_path):
+    """
+    Load questions from a JSONL file (one object per line) or a JSON array
+    such as data/test_data.json. Each item gets a stable `id`: its own
+    `id`/`request_id` field if present, otherwise its position in the file.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    questions = []
+    for position, item in enumerate(items):
+        question = item.get("question") or item.get("body") or item.get("title") or ""
+        item_id = str(item.get("id", item.get("request_id", position)))
+        questions.append({"id": item_id, "question": question, "expected": item.get("answer")})
+    return questions
+
+
+def completed_ids(output_path):
+    """
+    Ids already written to `output_path`, so an interrupted run can resume.
+    Records marked `failed` (preparation or generation raised) are not
+    counted, so a re-run retries them and appends a new record for the same
+    id: consumers should keep the last record per id. A partially written
+    last line is cut off so new records start cleanly.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) < len(data):
+            f.truncate(len(complete))
+    for line in complete.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+            if not record.get("failed"):
+                done.add(str(record["id"]))
+        except (ValueError, KeyError):
+            continue
+    return done
+
+
+def prepare_item(item, retrieve):
+    """
+    Run everything before generation for one question: sanitize, the greeting
+    and meta-question handlers, retrieval and prompt building.
+    """
+    timings = {}
+    record = {"id": item["id"], "question": item["question"], "expected": item["expected"],
+              "route": "rag", "answer": None, "context": "", "prompt": None, "timings": timings}
+    start = time.perf_counter()
+
+    try:
+        user_question = sanitize_input(item["question"])
+    except ValueError as e:
+        record["route"] = "error"
+        record["answer"] = f"خطا: {e}"
+        timings["sanitize"] = time.perf_counter() - start
+        return record
+    timings["sanitize"] = time.perf_counter() - start
+
+    t = time.perf_counter()
+    for route, handler in (("greeting", handle_greeting), ("meta", handle_meta_question)):
+        handled = handler(user_question)
+        if handled:
+            record["route"] = route
+            record["answer"] = handled[1]
+            break
+    timings["handlers"] = time.perf_counter() - t
+    if record["answer"] is not None:
+        return record
+
+    t = time.perf_counter()
+    retrieved_docs = retrieve(user_question) if retrieve else []
+    context_chunks, _ = build_context(retrieved_docs)
+    record["context"] = context_chunks
+    timings["retrieval"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    record["prompt"] = build_prompt(context_chunks, user_question, user_question, [], str(uuid.uuid4()))
+    timings["prompt"] = time.perf_counter() - t
+    return record
+
+
+def generate_answer(llm, prompt, max_tokens=512):
+    completion = llm.create_completion(
+        prompt=prompt,
+        max_tokens=max_tokens,
+        temperature=0.8,
+        top_p=0.95,
+        top_k=40,
+        repeat_penalty=1.1,
+        stream=False,
+        min_p=0,
+    )
+    text = completion["choices"][0]["text"]
+    return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
+
+
+def run_batch(questions, model_manager, output_path, retrieve=None, workers=4, queue_size=8, max_tokens=512):
+    """
+    Prepare questions concurrently on `workers` threads and feed them through a
+    bounded queue to a single generation loop on the ModelManager's current
+    model. Each finished item is appended to `output_path` as one JSON line.
+    Items already present in `output_path` are skipped unless they failed;
+    a retried item's new record follows its failed one.
+
+    Returns a summary dict with counts and throughput.
+    """
+    done = completed_ids(output_path)
+    pending = [item for item in questions if item["id"] not in done]
+    llm = model_manager.get_current_model()
+    prepared = queue.Queue(maxsize=queue_size)
+    batch_start = time.perf_counter()
+
+    def produce():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for item in pending:
+                submitted = time.perf_counter()
+                future = executor.submit(prepare_item, item, retrieve)
+                future.item, future.queued_at = item, submitted
+                prepared.put(future)
+        prepared.put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    written = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        while True:
+            future = prepared.get()
+            if future is _DONE:
+                break
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"id": future.item["id"], "question": future.item["question"],
+                          "expected": future.item["expected"], "route": "error", "answer": f"خطا: {e}",
+                          "failed": True, "timings": {}}
+            timings = record["timings"]
+            prompt = record.pop("prompt", None)
+            if prompt is not None and record["answer"] is None:
+                timings["queue_wait"] = time.perf_counter() - future.queued_at - sum(timings.values())
+                t = time.perf_counter()
+                try:
+                    record["answer"] = generate_answer(llm, prompt, max_tokens=max_tokens)
+                except Exception as e:
+                    record["route"] = "error"
+                    record["answer"] = f"خطا: {e}"
+                    record["failed"] = True
+                timings["generation"] = time.perf_counter() - t
+            timings["total"] = time.perf_counter() - future.queued_at
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            written += 1
+
+    producer.join()
+    elapsed = time.perf_counter() - batch_start
+    return {
+        "total": len(questions),
+        "skipped": len(questions) - len(pending),
+        "answered": written,
+        "seconds": elapsed,
+        "items_per_second": written / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def build_startup(args):
+    """
+    Load the LLM and the retrieval components in parallel, each warmed up with
+    one query before the batch starts.
+    """
+    from modules.startup import (StartupOrchestrator, load_embeddings, load_cross_encoder,
+                                 warmup_embeddings, warmup_cross_encoder, warmup_registry, warmup_llm)
+
+    model_manager = ModelManager()
+
+    def load_llm():
+        if args.stub_llm:
+            model_manager.use_model(StubLLM(), "stub")
+        else:
+            with open(args.models_file, "r", encoding="utf-8") as f:
+                models = json.load(f)
+            model_key = args.model or list(models.keys())[0]
+            model_info = models[model_key]
+            model_manager.load_model(model_info["path"], model_key, **model_info.get("params", {}))
+        return model_manager
+
+    def load_registry(embeddings, cross_encoder):
+        from modules.index_registry import IndexRegistry
+        return IndexRegistry.from_config(args.index_config, embeddings=embeddings, cross_encoder=cross_encoder)
+
+    startup = StartupOrchestrator()
+    startup.add("llm", load_llm, warmup=lambda manager: warmup_llm(manager.get_current_model()))
+    if not args.no_retrieval:
+        startup.add("embeddings", load_embeddings, warmup=warmup_embeddings)
+        startup.add("cross_encoder", load_cross_encoder, warmup=warmup_cross_encoder)
+        startup.add("registry", load_registry, warmup=warmup_registry, requires=["embeddings", "cross_encoder"])
+    return startup.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of Persian questions without the chat UI.")
+    parser.add_argument("input", help="JSONL file of questions, or a JSON array like data/test_data.json")
+    parser.add_argument("output", help="JSONL file to append answers to (resumed if it exists)")
+    parser.add_argument("--model", help="Key in models.json (defaults to the first model)")
+    parser.add_argument("--models-file", default="../data/models.json")
+    parser.add_argument("--stub-llm", action="store_true", help="Use StubLLM instead of loading a GGUF model")
+    parser.add_argument("--index-config", default="../data/indexes.json")
+    parser.add_argument("--index", help="Index name to search (defaults to the registry default)")
+    parser.add_argument("--no-retrieval", action="store_true", help="Skip retrieval and prompt with an empty context")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    startup = build_startup(args)
+    model_manager = startup.wait("llm")
+    retrieve = None
+    if not args.no_retrieval:
+        registry = startup.wait("registry")
+        retrieve = lambda query: registry.search(query, index=args.index)
+    print(startup.report())
+
+    questions = load_questions(args.input)
+    summary = run_batch(questions, model_manager, args.output, retrieve=retrieve,
+                        workers=args.workers, queue_size=args.queue_size, max_tokens=args.max_tokens)
+    print(f"Answered {summary['answered']} of {summary['total']} questions "
+          f"({summary['skipped']} already done) in {summary['seconds']:.2f}s "
+          f"({summary['items_per_second']:.2f} items/s)")
+    model_manager.unload_model()
+
+
+if __name__ == "__main__":
+    main()
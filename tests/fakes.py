@@ -0,0 +1,65 @@
+from modules.index_registry import IndexRegistry, Shard
+
+# ─────────────────────────────────
+# Fakes shared by the retrieval and batch tests
+# ─────────────────────────────────
+class Doc:
+    def __init__(self, page_content, chunk_index=0):
+        self.page_content = page_content
+        self.metadata = {"chunk_index": chunk_index}
+
+class FakeVectorStore:
+    """
+    Returns `hits[query]` when `hits` is a dict, otherwise the same texts for
+    every query. A text's distance is its position in the list.
+    """
+    def __init__(self, hits):
+        self.hits = hits
+
+    def similarity_search_with_score_by_vector(self, vector, k):
+        texts = self.hits.get(vector[0], []) if isinstance(self.hits, dict) else self.hits
+        return [(Doc(text), float(i)) for i, text in enumerate(texts[:k])]
+
+class FakeBM25:
+    """Scores every document 0 and records the query tokens it was asked about."""
+    def __init__(self):
+        self.queries = []
+
+    def get_batch_scores(self, tokens, doc_ids):
+        self.queries.append(tokens)
+        return [0.0 for _ in doc_ids]
+
+class FakeEmbeddings:
+    """Embeds a query as [query] so FakeVectorStore can look it up."""
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, query):
+        self.queries.append(query)
+        return [query]
+
+class FakeCrossEncoder:
+    """Longer texts score higher; records every text it scored."""
+    def __init__(self):
+        self.scored = []
+
+    def predict(self, pairs, batch_size=8):
+        self.scored.extend(text for _, text in pairs)
+        return [len(text) for _, text in pairs]
+
+def make_registry(shard_hits, indexes=None, embeddings=None, cross_encoder=None, loaded=None, bm25=None, **kwargs):
+    """
+    IndexRegistry over fake shards. `shard_hits` maps a shard path to the
+    texts it returns (a list, or a dict keyed by query); `loaded` collects
+    the paths the loader was called for.
+    """
+    def loader(path, _):
+        if loaded is not None:
+            loaded.append(path)
+        hits = shard_hits[path]
+        texts = [t for ts in hits.values() for t in ts] if isinstance(hits, dict) else hits
+        chunks = [Doc(text) for text in dict.fromkeys(texts)]
+        return Shard(FakeVectorStore(hits), chunks, bm25 or FakeBM25(), size_bytes=100)
+
+    return IndexRegistry(indexes or {"default": list(shard_hits)}, embeddings or FakeEmbeddings(),
+                         cross_encoder or FakeCrossEncoder(), loader=loader, tokenizer=str.split, **kwargs)
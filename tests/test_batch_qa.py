@@ -0,0 +1,78 @@
+import json
+from modules.model_manager import ModelManager
+from scripts.batch_qa import StubLLM, load_questions, run_batch
+from tests.fakes import Doc
+
+def make_manager():
+    model_manager = ModelManager()
+    model_manager.use_model(StubLLM(), "stub")
+    return model_manager
+
+def read_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_load_questions(tmp_path):
+    jsonl = tmp_path / "questions.jsonl"
+    jsonl.write_text('{"request_id": "q-1", "question": "سلام"}\n\n{"question": "تهران کجاست؟"}\n', encoding="utf-8")
+    assert [q["id"] for q in load_questions(str(jsonl))] == ["q-1", "1"]
+
+    array = tmp_path / "test_data.json"
+    array.write_text(json.dumps([{"question": "پایتخت ایران کجاست؟", "answer": "تهران"}]), encoding="utf-8")
+    assert load_questions(str(array)) == [{"id": "0", "question": "پایتخت ایران کجاست؟", "expected": "تهران"}]
+
+def test_run_batch_routes_and_timings(tmp_path):
+    questions = [
+        {"id": "a", "question": "سلام", "expected": None},
+        {"id": "b", "question": "پایتخت ایران کجاست؟", "expected": "تهران"},
+        {"id": "c", "question": "Hello", "expected": None},
+    ]
+    output = tmp_path / "answers.jsonl"
+    retrieve = lambda query: [Doc("پایتخت ایران تهران است. جمله دوم.")]
+    summary = run_batch(questions, make_manager(), str(output), retrieve=retrieve, workers=2)
+
+    records = {r["id"]: r for r in read_records(output)}
+    assert summary["answered"] == 3
+    assert records["a"]["route"] == "greeting"
+    assert records["b"]["route"] == "rag"
+    assert records["b"]["answer"] == "پایتخت ایران تهران است"
+    assert "generation" in records["b"]["timings"]
+    assert records["c"]["route"] == "error"
+
+def test_run_batch_resumes(tmp_path):
+    questions = [{"id": str(i), "question": "سوال شماره " + str(i), "expected": None} for i in range(3)]
+    output = tmp_path / "answers.jsonl"
+    output.write_text('{"id": "0", "answer": "قبلی"}\n{"id": "1", "ans', encoding="utf-8")
+
+    summary = run_batch(questions, make_manager(), str(output))
+    assert summary["skipped"] == 1
+    assert [r["id"] for r in read_records(output)] == ["0", "1", "2"]
+
+class FlakyLLM:
+    """Fails the first call, then answers."""
+    def __init__(self):
+        self.calls = 0
+
+    def create_completion(self, prompt, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("context overflow")
+        return {"choices": [{"text": "پاسخ"}]}
+
+def test_failed_generation_is_retried_on_resume(tmp_path):
+    questions = [{"id": "0", "question": "پایتخت ایران کجاست؟", "expected": "تهران"}]
+    output = tmp_path / "answers.jsonl"
+    model_manager = ModelManager()
+    model_manager.use_model(FlakyLLM(), "flaky")
+
+    run_batch(questions, model_manager, str(output))
+    failed = read_records(output)[0]
+    assert failed["failed"] is True
+    assert failed["expected"] == "تهران"
+
+    summary = run_batch(questions, model_manager, str(output))
+    assert summary["skipped"] == 0
+    # The retry is appended after the failed record; the last one per id wins
+    records = read_records(output)
+    assert [r["id"] for r in records] == ["0", "0"]
+    assert records[-1]["answer"] == "پاسخ" and "failed" not in records[-1]
@@ -0,0 +1,102 @@
+import pytest
+from modules.history import ConversationHistory, DROPPED_TOOL_OUTPUT, SUMMARY_HEADER
+
+def word_count(text):
+    return len(text.split())
+
+def make_history(**kwargs):
+    calls = []
+    def counter(text):
+        calls.append(text)
+        return word_count(text)
+    history = ConversationHistory(count_tokens=counter, **kwargs)
+    history.append({"role": "system", "content": "سیستم"})
+    return history, calls
+
+def add_exchange(history, n, tool_words=0):
+    history.append({"role": "user", "content": f"سوال {n}"})
+    if tool_words:
+        history.append({"role": "tool", "content": " ".join(["متن"] * tool_words)})
+    history.append({"role": "assistant", "content": f"پاسخ {n}"})
+
+def test_under_budget_keeps_everything():
+    history, calls = make_history(max_tokens=1000)
+    add_exchange(history, 1, tool_words=10)
+    assert history.messages() == [{"role": t["role"], "content": t["content"]} for t in history]
+
+    # Counts are cached, so asking again does not re-tokenize
+    before = len(calls)
+    history.messages()
+    assert len(calls) == before
+
+def test_old_tool_outputs_dropped_first():
+    history, _ = make_history(max_tokens=120, keep_tool_outputs=0)
+    add_exchange(history, 1, tool_words=100)
+    add_exchange(history, 2)
+    messages = history.messages()
+
+    assert messages[0]["content"] == "سیستم"
+    assert {"role": "tool", "content": DROPPED_TOOL_OUTPUT} in messages
+    assert messages[1]["content"] == "سوال 1"
+    assert history.summary == ""
+    assert len(history) == 6
+
+def test_current_tool_output_is_kept():
+    history, _ = make_history(max_tokens=50, keep_tool_outputs=0)
+    history.append({"role": "user", "content": "سوال"})
+    history.append({"role": "tool", "content": " ".join(["متن"] * 100)})
+    messages = history.messages()
+    assert messages[-1]["content"].startswith("متن")
+
+def test_old_turns_folded_into_summary_and_prefix_stable():
+    history, _ = make_history(max_tokens=60)
+    for n in range(10):
+        add_exchange(history, n)
+    messages = history.messages()
+
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"].startswith(SUMMARY_HEADER)
+    assert "سوال 8" in history.summary
+    assert messages[-1]["content"] == "پاسخ 9"
+    assert history.token_count() <= 60 * history.low_water
+
+    # Appending a turn after compaction keeps the rendered prefix unchanged
+    add_exchange(history, 10)
+    assert history.messages()[:len(messages)] == messages
+
+def test_memory_bounded_in_long_sessions():
+    history, _ = make_history(max_tokens=200, max_turns=10, keep_tool_outputs=0)
+    for n in range(50):
+        add_exchange(history, n, tool_words=20)
+        messages = history.messages()
+    assert len(history) <= 10 + 1
+    assert history[0]["content"] == "سیستم"
+    assert messages[-1]["content"] == "پاسخ 49"
+    # Tool outputs dropped from the prompt do not keep their text either
+    prompt_texts = {m["content"] for m in messages}
+    tool_texts = [t["content"] for t in history if t["role"] == "tool"]
+    assert DROPPED_TOOL_OUTPUT in tool_texts
+    assert all(text == DROPPED_TOOL_OUTPUT or text in prompt_texts for text in tool_texts)
+
+def test_summary_dropped_when_it_cannot_fit():
+    # The summary budget (8 words) holds the header and nothing else
+    history, _ = make_history(max_tokens=27)
+    for n in range(30):
+        add_exchange(history, n)
+    messages = history.messages()
+    assert history.summary == ""
+    assert messages[-1]["content"] == "پاسخ 29"
+
+def test_budget_too_small_for_summary_header():
+    with pytest.raises(ValueError):
+        ConversationHistory(max_tokens=40)
+
+def test_clear():
+    history, _ = make_history(max_tokens=60)
+    for n in range(10):
+        add_exchange(history, n)
+    history.messages()
+    history.clear()
+    assert len(history) == 0
+    assert history.summary == ""
+    assert history.messages() == []
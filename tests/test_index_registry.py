@@ -0,0 +1,99 @@
+import os
+import json
+import pickle
+import pytest
+from modules import index_registry
+from modules.index_registry import IndexRegistry, Shard, load_bm25
+from tests.fakes import Doc, FakeVectorStore, FakeEmbeddings, FakeCrossEncoder, make_registry
+
+INDEXES = {"default": ["a"], "customer": ["a", "b"]}
+
+def test_search_fans_out_and_merges():
+    corpus = {"a": ["x", "xx"], "b": ["xxx", "xx"]}
+    loaded = []
+    registry = make_registry(corpus, INDEXES, loaded=loaded)
+
+    docs = registry.search("query", index="customer", k=2, min_score=None)
+    assert [d.page_content for d in docs] == ["xxx", "xx"]
+    assert sorted(loaded) == ["a", "b"]
+
+    # Default index only touches its own shard, which is already loaded
+    docs = registry.search("query", k=5, min_score=None)
+    assert [d.page_content for d in docs] == ["xx", "x"]
+    assert sorted(loaded) == ["a", "b"]
+
+def test_reranks_global_top_fetch_k_across_shards():
+    corpus = {"a": ["x", "xx", "xxx"], "b": ["y", "yy", "yyy"]}
+    cross_encoder = FakeCrossEncoder()
+    registry = make_registry(corpus, cross_encoder=cross_encoder, fetch_k=3)
+    docs = registry.search("query", k=5, min_score=None)
+    # Only the three closest hits over both shards reach the CrossEncoder
+    assert sorted(cross_encoder.scored) == ["x", "xx", "y"]
+    assert [d.page_content for d in docs] == ["xx", "x", "y"]
+
+def test_cross_encoder_cache_evicts_least_recently_used():
+    cross_encoder = FakeCrossEncoder()
+    registry = make_registry({"a": ["x"]}, cross_encoder=cross_encoder, score_cache_size=2)
+    registry._cross_encoder_scores("q", [Doc("x"), Doc("y")])
+    registry._cross_encoder_scores("q", [Doc("x")])
+    registry._cross_encoder_scores("q", [Doc("z")])
+    # "x" was used after "y", so "y" is the one evicted
+    cross_encoder.scored.clear()
+    registry._cross_encoder_scores("q", [Doc("x"), Doc("y")])
+    assert cross_encoder.scored == ["y"]
+
+def test_unknown_index():
+    registry = make_registry({"a": ["x"]}, INDEXES)
+    with pytest.raises(ValueError):
+        registry.search("query", index="missing")
+
+def test_lazy_loading_and_eviction():
+    corpus = {"a": ["x"], "b": ["y"]}
+    loaded = []
+    registry = make_registry(corpus, INDEXES, loaded=loaded, max_memory_bytes=150, max_workers=1)
+    assert registry.loaded_shards() == []
+
+    registry.search("query", index="default", min_score=None)
+    assert registry.loaded_shards() == ["a"]
+
+    # Loading both shards exceeds the cap, so the idle LRU shard is evicted
+    registry.search("query", index="customer", min_score=None)
+    assert registry.memory_usage() <= 150
+    assert registry.loaded_shards() == ["b"]
+    # Ranking reuses the shards from the fan-out instead of reloading them
+    assert loaded == ["a", "b"]
+
+def test_from_config(tmp_path):
+    config = tmp_path / "indexes.json"
+    config.write_text(json.dumps({"default": {"shards": ["shard_0", "shard_1"]}}))
+    registry = IndexRegistry.from_config(str(config), FakeEmbeddings(), FakeCrossEncoder())
+    assert registry.resolve() == [str(tmp_path / "shard_0"), str(tmp_path / "shard_1")]
+
+class IdBM25:
+    def get_batch_scores(self, tokens, doc_ids):
+        return [float(i) for i in doc_ids]
+
+def test_hits_missing_from_chunks_score_zero():
+    chunks = [Doc("x"), Doc("xx"), Doc("xxx")]
+    shard = Shard(FakeVectorStore(chunks), chunks, IdBM25())
+    scores = shard.bm25_scores(["query"], chunks[1:] + [Doc("missing")])
+    assert scores == [0.0, 1.0, 0.0]
+
+def test_bm25_built_once_and_saved(tmp_path, monkeypatch):
+    builds = []
+    def build(chunks):
+        builds.append(len(chunks))
+        return {"chunks": len(chunks)}
+    monkeypatch.setattr(index_registry, "_build_bm25", build)
+    chunks_path = tmp_path / "chunks.pkl"
+    chunks_path.write_bytes(pickle.dumps(["x", "y"]))
+
+    assert load_bm25(str(tmp_path), ["x", "y"]) == {"chunks": 2}
+    assert load_bm25(str(tmp_path), ["x", "y"]) == {"chunks": 2}
+    assert builds == [2]
+
+    # Regenerated chunks make the saved model stale
+    bm25_mtime = os.path.getmtime(tmp_path / "bm25.pkl")
+    os.utime(chunks_path, (bm25_mtime + 10, bm25_mtime + 10))
+    load_bm25(str(tmp_path), ["x", "y", "z"])
+    assert builds == [2, 3]
@@ -0,0 +1,99 @@
+import threading
+from modules.model_manager import llm_lock
+from modules.query_pipeline import QueryStage, AuditWorker
+from tests.fakes import FakeBM25, FakeEmbeddings, FakeCrossEncoder, make_registry
+
+class RewritingLLM:
+    """Rewrites to `text`; refuses to answer until retrieval has started."""
+    def __init__(self, text, retrieval_started):
+        self.text = text
+        self.retrieval_started = retrieval_started
+
+    def create_completion(self, prompt, **kwargs):
+        assert self.retrieval_started.wait(timeout=2)
+        return {"choices": [{"text": self.text}]}
+
+def test_speculative_retrieval_with_delta():
+    hits = {"original": ["aa", "bbb"], "rewritten": ["bbb", "cccc"]}
+    started = threading.Event()
+    cross_encoder, bm25 = FakeCrossEncoder(), FakeBM25()
+    registry = make_registry({"a": hits}, cross_encoder=cross_encoder, bm25=bm25)
+    original_candidates = registry.candidates
+    def candidates(query, index=None):
+        started.set()
+        return original_candidates(query, index)
+    registry.candidates = candidates
+
+    stage = QueryStage(registry, lambda: RewritingLLM("rewritten", started))
+    docs, rewritten = stage.retrieve("original", min_score=None)
+
+    assert rewritten == "rewritten"
+    assert [d.page_content for d in docs] == ["cccc", "bbb", "aa"]
+    # Chunks returned for both queries are scored by the CrossEncoder only once
+    assert sorted(cross_encoder.scored) == ["aa", "bbb", "cccc"]
+    # The merged set is scored with BM25 against the original question only
+    assert all(tokens == ["original"] for tokens in bm25.queries)
+
+def test_unchanged_rewrite_skips_delta():
+    hits = {"original": ["aa"]}
+    started = threading.Event()
+    started.set()
+    embeddings = FakeEmbeddings()
+    stage = QueryStage(make_registry({"a": hits}, embeddings=embeddings), lambda: RewritingLLM("original", started))
+    docs, rewritten = stage.retrieve("original", min_score=None)
+    assert rewritten == "original"
+    assert [d.page_content for d in docs] == ["aa"]
+    assert embeddings.queries == ["original"]
+
+class AuditLLM:
+    """Blocks each audit until `release` is set and records the order of calls."""
+    def __init__(self, verdict, order):
+        self.verdict = verdict
+        self.order = order
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def create_completion(self, prompt, **kwargs):
+        self.order.append("audit")
+        self.started.set()
+        assert self.release.wait(timeout=2)
+        return {"choices": [{"text": self.verdict}]}
+
+def test_audit_worker_replaces_waiting_job():
+    llm = AuditLLM("پاک", [])
+    results = {}
+    worker = AuditWorker(lambda: llm)
+    on_result = lambda job_id, is_clean: results.__setitem__(job_id, is_clean)
+
+    assert worker.submit(1, "پاسخ", "متن", on_result) is None
+    assert llm.started.wait(timeout=2)
+    # Job 1 is running; job 2 waits and is replaced by the newer job 3
+    assert worker.submit(2, "پاسخ", "متن", on_result) is None
+    assert worker.submit(3, "پاسخ", "متن", on_result) == 2
+
+    llm.release.set()
+    worker.join()
+    assert results == {1: True, 3: True}
+
+def test_generation_is_not_blocked_behind_waiting_audits():
+    order = []
+    llm = AuditLLM("پاک", order)
+    worker = AuditWorker(lambda: llm)
+    on_result = lambda job_id, is_clean: None
+
+    worker.submit(1, "پاسخ", "متن", on_result)
+    assert llm.started.wait(timeout=2)
+    worker.submit(2, "پاسخ", "متن", on_result)
+
+    def generate():
+        with llm_lock:
+            order.append("generation")
+    generation = threading.Thread(target=generate)
+    generation.start()
+    assert llm_lock.foreground_waiting.wait(timeout=2)
+
+    llm.release.set()
+    generation.join(timeout=2)
+    worker.join()
+    # The question waits only for the audit already running, not the one queued
+    assert order == ["audit", "generation", "audit"]
@@ -0,0 +1,55 @@
+import time
+import pytest
+from modules.startup import StartupOrchestrator
+
+def slow(value, delay=0.2, spans=None):
+    def loader(**deps):
+        start = time.perf_counter()
+        time.sleep(delay)
+        if spans is not None:
+            spans[value] = (start, time.perf_counter())
+        return value
+    return loader
+
+def test_components_load_in_parallel():
+    warmed, spans = [], {}
+    startup = StartupOrchestrator()
+    startup.add("a", slow("A", spans=spans), warmup=warmed.append)
+    startup.add("b", slow("B", spans=spans), warmup=warmed.append)
+    assert not startup.is_ready()
+
+    startup.start()
+    assert startup.wait("a") == "A"
+    assert startup.wait("b") == "B"
+    # The two loads ran at the same time: their intervals intersect
+    (a_start, a_end), (b_start, b_end) = spans["A"], spans["B"]
+    assert a_start < b_end and b_start < a_end
+    assert startup.is_ready()
+    assert sorted(warmed) == ["A", "B"]
+    assert "load" in startup.components["a"].timings
+
+def test_dependencies_and_failures():
+    def broken():
+        raise OSError("missing model")
+
+    startup = StartupOrchestrator()
+    startup.add("embeddings", slow("E", 0.05))
+    startup.add("registry", lambda embeddings: embeddings + "-registry", requires=["embeddings"])
+    startup.add("llm", broken)
+    startup.add("agent", lambda llm: llm, requires=["llm"])
+    startup.start()
+
+    assert startup.wait("registry") == "E-registry"
+    with pytest.raises(RuntimeError):
+        startup.wait("agent", timeout=1)
+    assert startup.status()["llm"] == "failed"
+    assert not startup.is_ready()
+    assert "registry" in startup.report()
+
+def test_wait_timeout():
+    startup = StartupOrchestrator()
+    startup.add("slow", slow("S", 0.5))
+    startup.start()
+    with pytest.raises(TimeoutError):
+        startup.wait("slow", timeout=0.01)
+    assert startup.is_ready("slow") is False